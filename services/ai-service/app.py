@@ -1,12 +1,37 @@
-from flask import Flask, jsonify, request
-from flask_cors import CORS
+import time
+from contextlib import contextmanager
+
+BOOT_STARTED = time.perf_counter()
+STARTUP_TIMINGS = []  # (step, seconds), printed at boot and exposed on /ready
+
+@contextmanager
+def startup_step(name):
+    """Record how long an import or initialization step takes"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS.append((name, time.perf_counter() - started))
+
 import os
 import json
-import requests
-from google import genai
-from groq import Groq
-from openai import OpenAI
-from dotenv import load_dotenv
+import hashlib
+import random
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+with startup_step("import flask"):
+    from flask import Flask, jsonify, request
+    from flask_cors import CORS
+with startup_step("import requests"):
+    import requests
+with startup_step("import dotenv"):
+    from dotenv import load_dotenv
+
+# Provider SDKs (google-genai, groq, openai) are imported on first use so a cold
+# start only pays for the providers that are actually called.
 
 load_dotenv()
 
@@ -19,38 +44,240 @@ HF_API_KEY = os.getenv("HF_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
-# Initialize Groq Client
-try:
-    if GROQ_API_KEY:
-        groq_client = Groq(api_key=GROQ_API_KEY)
-    else:
-        groq_client = None
-        print("Warning: GROQ_API_KEY not set")
-except Exception as e:
-    groq_client = None
-    print(f"Failed to initialize Groq Client: {e}")
+# Ollama local inference
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.2")
+# How long Ollama keeps the model loaded after a request ("30m", seconds, or -1 to pin it)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+# Longest gap allowed between two streamed chunks once generation has started
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 120))
+# Longest prompt we send (summary text window plus instructions), in characters
+PROMPT_BUDGET_CHARS = 16000
+# Before the first chunk Ollama may still be loading the model and reading the whole
+# prompt, which runs at a few tens of tokens/s on CPU; the default allows 20 tokens/s
+OLLAMA_FIRST_CHUNK_TIMEOUT = float(
+    os.getenv("OLLAMA_FIRST_CHUNK_TIMEOUT", 0)
+) or OLLAMA_READ_TIMEOUT + PROMPT_BUDGET_CHARS // 4 / 20
+# Largest response is the biggest quiz the UI offers: 25 questions, each with a hint
+# and four options with rationales (~300 tokens per question)
+MAX_QUIZ_QUESTIONS = 25
+TOKENS_PER_QUIZ_QUESTION = 300
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", 0)) or MAX_QUIZ_QUESTIONS * TOKENS_PER_QUIZ_QUESTION
+
+def default_ollama_num_ctx():
+    """Context window covering the largest prompt plus the largest answer.
+    It stays fixed because changing num_ctx between requests makes Ollama reload the model."""
+    tokens = PROMPT_BUDGET_CHARS // 4 + OLLAMA_NUM_PREDICT
+    return ((tokens + 1023) // 1024) * 1024
+
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", 0)) or default_ollama_num_ctx()
+
+# Providers to initialize in the background at boot (e.g. "gemini,groq"); others load on first use
+PRELOAD_PROVIDERS = [p.strip() for p in os.getenv("PRELOAD_PROVIDERS", "").split(",") if p.strip()]
+
+# Provider admission control. Rates are requests per minute (0 = unlimited) and
+# should sit a little below each provider's quota so we keep headroom on the
+# fast providers; concurrency caps the number of in-flight calls per provider.
+PROVIDER_LIMITS = {
+    "gemini": {
+        "rpm": float(os.getenv("GEMINI_RPM", 12)),
+        "burst": float(os.getenv("GEMINI_BURST", 4)),
+        "concurrency": int(os.getenv("GEMINI_CONCURRENCY", 4)),
+    },
+    "groq": {
+        "rpm": float(os.getenv("GROQ_RPM", 25)),
+        "burst": float(os.getenv("GROQ_BURST", 5)),
+        "concurrency": int(os.getenv("GROQ_CONCURRENCY", 4)),
+    },
+    "ollama": {
+        "rpm": float(os.getenv("OLLAMA_RPM", 0)),
+        "burst": float(os.getenv("OLLAMA_BURST", 1)),
+        # Match the Ollama server's OLLAMA_NUM_PARALLEL; extra requests wait in a bounded queue
+        "concurrency": int(os.getenv("OLLAMA_NUM_PARALLEL", 1)),
+        "max_queue": int(os.getenv("OLLAMA_MAX_QUEUE", 8)),
+        "max_wait": float(os.getenv("OLLAMA_QUEUE_TIMEOUT", 120)),
+    },
+}
+# Longest a request waits for a provider slot before falling back to the next one
+PROVIDER_MAX_WAIT = float(os.getenv("PROVIDER_MAX_WAIT", 2))
+
+# Near-duplicate document reuse (re-uploaded decks with small edits)
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.85))
+DEDUP_MAX_DOCS = int(os.getenv("DEDUP_MAX_DOCS", 500))
+# Stored results older than this (seconds) are not reused
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", 24 * 3600))
 
+# Speculative topic/summary generation right after a document is parsed (opt-in)
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+PREFETCH_MAX_PENDING = int(os.getenv("PREFETCH_MAX_PENDING", 8))
+# Prefetch is skipped (and queued prefetch dropped) once this many user AI calls are in flight.
+# It also only runs on spare provider capacity, so Ollama needs OLLAMA_NUM_PARALLEL >= 2.
+PREFETCH_MAX_LOAD = int(os.getenv("PREFETCH_MAX_LOAD", 2))
+PREFETCH_MAX_RESULTS = 100
 
+class RateLimitExceeded(Exception):
+    """Raised when no provider can admit a request within its wait budget"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Thread-safe token bucket that lets callers reserve a future token"""
+
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait=0, spare=0):
+        """Returns (True, wait) when admitted after `wait` seconds, else (False, retry_after).
+        `spare` tokens are left in the bucket for other callers."""
+        if self.rate <= 0:
+            return True, 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 + spare - self.tokens) / self.rate)
+            if wait > max_wait:
+                return False, wait
+            self.tokens -= 1
+            return True, wait
+
+    def refund(self):
+        if self.rate <= 0:
+            return
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+provider_buckets = {
+    name: TokenBucket(limits["rpm"], limits["burst"]) for name, limits in PROVIDER_LIMITS.items()
+}
+provider_semaphores = {
+    name: threading.BoundedSemaphore(max(1, limits["concurrency"])) for name, limits in PROVIDER_LIMITS.items()
+}
+provider_waiting = {name: 0 for name in PROVIDER_LIMITS}
+provider_active = {name: 0 for name in PROVIDER_LIMITS}
+provider_queue_lock = threading.Lock()
+
+@contextmanager
+def provider_slot(provider, background=False):
+    """Admit a call to `provider` through its token bucket and concurrency cap.
+
+    Background calls never wait and only use spare capacity: they need a token
+    beyond the next one, a slot beyond the last free one, and no queued user call."""
+    limits = PROVIDER_LIMITS[provider]
+    max_wait = 0 if background else limits.get("max_wait", PROVIDER_MAX_WAIT)
+    bucket = provider_buckets[provider]
+    granted, wait = bucket.reserve(max_wait, spare=1 if background else 0)
+    if not granted:
+        raise RateLimitExceeded(f"{provider} local rate limit reached", wait)
+    started = time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+
+    semaphore = provider_semaphores[provider]
+    concurrency = max(1, limits["concurrency"])
+    # Acquire and register as waiting under one lock so a background call
+    # can never slip into a slot ahead of a user call that is queued for it
+    with provider_queue_lock:
+        if background:
+            if (provider_waiting[provider] or provider_active[provider] + 1 >= concurrency
+                    or not semaphore.acquire(blocking=False)):
+                bucket.refund()
+                raise RateLimitExceeded(f"{provider} has no spare capacity for background work", 1)
+            acquired = True
+        else:
+            acquired = semaphore.acquire(blocking=False)
+            if not acquired:
+                if "max_queue" in limits and provider_waiting[provider] >= limits["max_queue"]:
+                    bucket.refund()
+                    raise RateLimitExceeded(f"{provider} queue is full", max(max_wait, 1))
+                provider_waiting[provider] += 1
+        if acquired:
+            provider_active[provider] += 1
+
+    if not acquired:
+        try:
+            acquired = semaphore.acquire(timeout=max(0.0, max_wait - (time.monotonic() - started)))
+        finally:
+            with provider_queue_lock:
+                provider_waiting[provider] -= 1
+                if acquired:
+                    provider_active[provider] += 1
+        if not acquired:
+            bucket.refund()
+            raise RateLimitExceeded(f"{provider} concurrency limit reached", max(max_wait, 1))
+    try:
+        yield
+    finally:
+        with provider_queue_lock:
+            provider_active[provider] -= 1
+        semaphore.release()
+
+def rate_limit_response(e):
+    """Build a 429 response with a Retry-After header"""
+    retry_after = max(1, int(e.retry_after + 0.999))
+    response = jsonify({"success": False, "error": "AI providers are busy. Please try again shortly.", "retryAfter": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+# Provider clients are created lazily by get_gemini_client / get_groq_client
+gemini_client = None
+groq_client = None
+provider_init_lock = threading.Lock()
+
+if not GROQ_API_KEY:
+    print("Warning: GROQ_API_KEY not set")
+if not GEMINI_API_KEY:
+    print("Warning: GEMINI_API_KEY not set")
 
 def configure_genai():
     """Configure Gemini AI - No longer needed with direct requests but kept for interface compatibility if needed"""
     pass
 
-# Initialize Google GenAI Client
-try:
-    if GEMINI_API_KEY:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-    else:
-        client = None
-        print("Warning: GEMINI_API_KEY not set")
-except Exception as e:
-    client = None
-    print(f"Failed to initialize Gemini Client: {e}")
+def get_gemini_client():
+    """Import google-genai and create the Gemini client on first use"""
+    global gemini_client
+    if gemini_client is None:
+        if not GEMINI_API_KEY:
+            raise Exception("Gemini Client not initialized")
+        with provider_init_lock:
+            if gemini_client is None:
+                try:
+                    with startup_step("import google.genai"):
+                        from google import genai
+                    with startup_step("init gemini client"):
+                        gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+                except Exception as e:
+                    raise Exception(f"Failed to initialize Gemini Client: {e}")
+                print("Gemini Client initialized")
+    return gemini_client
+
+def get_groq_client():
+    """Import groq and create the Groq client on first use"""
+    global groq_client
+    if groq_client is None:
+        if not GROQ_API_KEY:
+            raise Exception("Groq Client not initialized (check GROQ_API_KEY)")
+        with provider_init_lock:
+            if groq_client is None:
+                try:
+                    with startup_step("import groq"):
+                        from groq import Groq
+                    with startup_step("init groq client"):
+                        groq_client = Groq(api_key=GROQ_API_KEY)
+                except Exception as e:
+                    raise Exception(f"Failed to initialize Groq Client: {e}")
+                print("Groq Client initialized")
+    return groq_client
 
 def query_gemini_new(prompt, model_id="gemini-2.0-flash"):
     """Query Gemini 2.0 API using google-genai SDK"""
-    if not client:
-        raise Exception("Gemini Client not initialized")
+    client = get_gemini_client()
     
     # Map old model names to new ones if necessary, or just use what's passed
     if model_id == "gemini-1.5-flash":
@@ -67,8 +294,7 @@ def query_gemini_new(prompt, model_id="gemini-2.0-flash"):
 
 def query_groq(prompt, model_id="llama-3.3-70b-versatile"):
     """Query Groq API"""
-    if not groq_client:
-        raise Exception("Groq Client not initialized (check GROQ_API_KEY)")
+    groq_client = get_groq_client()
     
     # Map old model names to new ones
     if model_id in ["llama3-70b-8192", "llama-3.1-70b-versatile"]:
@@ -88,25 +314,93 @@ def query_groq(prompt, model_id="llama-3.3-70b-versatile"):
     except Exception as e:
         raise Exception(f"Groq Inference Failed: {str(e)}")
 
-def query_ollama(prompt, model_id="llama3"):
-    """Query local Ollama instance"""
+def ollama_keep_alive():
+    """Ollama takes keep_alive as a number of seconds or a duration string like "30m" """
+    try:
+        return int(OLLAMA_KEEP_ALIVE)
+    except ValueError:
+        return OLLAMA_KEEP_ALIVE
+
+def ollama_options():
+    return {"num_ctx": OLLAMA_NUM_CTX, "num_predict": OLLAMA_NUM_PREDICT}
+
+# Set once OLLAMA_MODEL has been loaded, by preloading or by a successful call
+ollama_model_loaded = False
+
+def query_ollama(prompt, model_id=OLLAMA_MODEL):
+    """Query local Ollama instance, streaming tokens as they are generated"""
+    global ollama_model_loaded
     url = f"{OLLAMA_BASE_URL}/api/generate"
     payload = {
         "model": model_id,
         "prompt": prompt,
-        "stream": False
+        "stream": True,
+        "keep_alive": ollama_keep_alive(),
+        "options": ollama_options()
     }
     
     try:
-        response = requests.post(url, json=payload)
-        if response.status_code != 200:
-            raise Exception(f"Ollama Error {response.status_code}: {response.text}")
-        return response.json()['response']
-    except requests.exceptions.ConnectionError:
+        started = time.perf_counter()
+        first_token = None
+        first_chunk = True
+        done = False
+        chunks = []
+        # Read timeouts apply between streamed chunks, not to the whole generation:
+        # a generous one until the first chunk, then OLLAMA_READ_TIMEOUT
+        with requests.post(url, json=payload, stream=True, timeout=(5, OLLAMA_FIRST_CHUNK_TIMEOUT)) as response:
+            if response.status_code != 200:
+                raise Exception(f"Ollama Error {response.status_code}: {response.text}")
+            # chunk_size=None hands over each chunk as soon as it arrives instead of buffering
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                if first_chunk:
+                    first_chunk = False
+                    sock = getattr(getattr(response.raw, "connection", None), "sock", None)
+                    if sock is not None:
+                        sock.settimeout(OLLAMA_READ_TIMEOUT)
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise Exception(f"Ollama Error: {chunk['error']}")
+                if chunk.get("response"):
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    chunks.append(chunk["response"])
+                if chunk.get("done"):
+                    done = True
+                    break
+        if not done:
+            raise Exception(f"stream ended before the response was complete ({len(chunks)} chunks received)")
+        print(f"DEBUG: Ollama {model_id} first token after {first_token or 0:.2f}s, done in {time.perf_counter() - started:.2f}s")
+        if model_id == OLLAMA_MODEL:
+            ollama_model_loaded = True
+        return "".join(chunks)
+    except requests.exceptions.ConnectionError as e:
+        # requests reports a read timeout during streaming as a ConnectionError
+        if not first_chunk:
+            raise Exception(f"Ollama Inference Failed: stream stalled for over {OLLAMA_READ_TIMEOUT:.0f}s ({str(e)})")
         raise Exception("Could not connect to Ollama. Is it running?")
     except Exception as e:
         raise Exception(f"Ollama Inference Failed: {str(e)}")
 
+def preload_ollama_model():
+    """Load OLLAMA_MODEL into memory ahead of the first request and keep it there"""
+    global ollama_model_loaded
+    payload = {
+        "model": OLLAMA_MODEL,
+        "keep_alive": ollama_keep_alive(),
+        "options": ollama_options()
+    }
+    try:
+        with startup_step(f"load ollama model {OLLAMA_MODEL}"):
+            response = requests.post(f"{OLLAMA_BASE_URL}/api/generate", json=payload, timeout=(5, 600))
+    except requests.exceptions.ConnectionError:
+        raise Exception("Could not connect to Ollama. Is it running?")
+    if response.status_code != 200:
+        raise Exception(f"Ollama Error {response.status_code}: {response.text}")
+    ollama_model_loaded = True
+    print(f"Ollama model {OLLAMA_MODEL} loaded (num_ctx={OLLAMA_NUM_CTX}, keep_alive={OLLAMA_KEEP_ALIVE})")
+
 def query_huggingface(prompt, model_id, api_key=None):
     """Query Hugging Face models"""
     if not api_key:
@@ -118,6 +412,8 @@ def query_huggingface(prompt, model_id, api_key=None):
     if not model_id:
         model_id = "zai-org/GLM-4.7-Flash:novita"
 
+    from openai import OpenAI
+
     client = OpenAI(
         base_url="https://router.huggingface.co/v1",
         api_key=api_key
@@ -135,8 +431,16 @@ def query_huggingface(prompt, model_id, api_key=None):
     except Exception as e:
         raise Exception(f"Hugging Face Inference Failed: {str(e)}")
 
-def query_ai_with_fallback(prompt, provider=None, model_id=None):
-    """Unified query function with automatic fallback on failure (e.g. quota limits)"""
+def query_ai_with_fallback(prompt, provider=None, model_id=None, background=False):
+    """Unified query function with automatic fallback on failure (e.g. quota limits).
+    Background calls only use spare provider capacity so they cannot delay user requests;
+    every other call counts as user load, which holds back prefetching."""
+    if background:
+        return query_providers(prompt, provider, model_id, background=True)
+    with prefetcher.user_call():
+        return query_providers(prompt, provider, model_id)
+
+def query_providers(prompt, provider=None, model_id=None, background=False):
     # Order of fallback: Requested -> Gemini -> Groq -> Ollama
     providers_to_try = []
     
@@ -149,6 +453,7 @@ def query_ai_with_fallback(prompt, provider=None, model_id=None):
             providers_to_try.append(p)
     
     last_error = None
+    busy_retry_after = None
     for p in providers_to_try:
         try:
             print(f"DEBUG: Trying AI provider: {p}")
@@ -157,19 +462,28 @@ def query_ai_with_fallback(prompt, provider=None, model_id=None):
                 if not GROQ_API_KEY: 
                     raise Exception("Groq API Key missing")
                 m = model_id if provider == "groq" else "llama-3.3-70b-versatile"
-                return query_groq(prompt, m)
+                with provider_slot(p, background):
+                    return query_groq(prompt, m)
             
             elif p == "gemini":
                 # Only try Gemini if key is available
                 if not GEMINI_API_KEY:
                     raise Exception("Gemini API Key missing")
                 m = model_id if provider == "gemini" else "gemini-2.0-flash"
-                return query_gemini_new(prompt, m)
+                with provider_slot(p, background):
+                    return query_gemini_new(prompt, m)
                 
             elif p == "ollama":
-                m = model_id if provider == "ollama" else "llama3.2"
-                return query_ollama(prompt, m)
-                
+                m = model_id if provider == "ollama" and model_id else OLLAMA_MODEL
+                with provider_slot(p, background):
+                    return query_ollama(prompt, m)
+
+        except RateLimitExceeded as e:
+            # Saturated locally: keep its quota headroom and fall back without calling it
+            last_error = str(e)
+            busy_retry_after = e.retry_after if busy_retry_after is None else min(busy_retry_after, e.retry_after)
+            print(f"WARNING: Provider {p} busy: {last_error}")
+            continue
         except Exception as e:
             last_error = str(e)
             print(f"WARNING: Provider {p} failed: {last_error}")
@@ -181,8 +495,319 @@ def query_ai_with_fallback(prompt, provider=None, model_id=None):
                 # but for safety let's try the next one anyway.
                 continue
                 
+    if busy_retry_after is not None:
+        raise RateLimitExceeded(f"All AI providers busy or failed. Last error: {last_error}", busy_retry_after)
     raise Exception(f"All AI providers failed. Last error: {last_error}")
 
+class SimilarityIndex:
+    """In-memory MinHash/LSH index over word shingles of document text.
+
+    Each indexed document keeps its generated results, keyed by whatever the
+    caller passes (e.g. kind, provider and model), so a later upload whose
+    estimated Jaccard similarity is above the threshold can reuse them instead
+    of calling an AI provider again.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16
+    SHINGLE_SIZE = 5
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold=0.85, max_docs=500, ttl=24 * 3600):
+        self.threshold = threshold
+        self.max_docs = max_docs
+        self.ttl = ttl
+        rng = random.Random(1729)
+        self.perms = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(self.NUM_PERM)]
+        self.rows = self.NUM_PERM // self.BANDS
+        self.docs = OrderedDict()  # doc_id -> {"signature": [...], "results": {key: (result, stored_at)}}
+        self.buckets = {}  # (band, band_hash) -> set(doc_id)
+        self.lock = threading.Lock()
+
+    def _shingle_hashes(self, text):
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < self.SHINGLE_SIZE:
+            words = words + [""] * (self.SHINGLE_SIZE - len(words))
+        hashes = set()
+        for i in range(len(words) - self.SHINGLE_SIZE + 1):
+            shingle = " ".join(words[i:i + self.SHINGLE_SIZE])
+            hashes.add(int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big"))
+        return hashes
+
+    def signature(self, text):
+        hashes = self._shingle_hashes(text)
+        prime = self._PRIME
+        return [min((a * h + b) % prime for h in hashes) for a, b in self.perms]
+
+    def _band_keys(self, signature):
+        return [(band, hash(tuple(signature[band * self.rows:(band + 1) * self.rows])))
+                for band in range(self.BANDS)]
+
+    def _live_result(self, doc, key, now):
+        """Return the unexpired `key` result of a document, dropping it if stale (lock held)"""
+        entry = doc["results"].get(key)
+        if entry is None:
+            return None
+        if now - entry[1] > self.ttl:
+            del doc["results"][key]
+            return None
+        return entry[0]
+
+    @staticmethod
+    def doc_id(text):
+        return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+    def lookup(self, text, key):
+        """Return (result, similarity, signature) for the most similar document
+        holding a `key` result above the threshold, or (None, 0, signature).
+
+        The exact-hash check runs first; the MinHash signature is only computed
+        when it misses (signature is None on an exact hit)."""
+        doc_id = self.doc_id(text)
+        with self.lock:
+            doc = self.docs.get(doc_id)
+            result = self._live_result(doc, key, time.monotonic()) if doc else None
+            if result is not None:
+                self.docs.move_to_end(doc_id)
+                return result, 1.0, None
+
+        signature = self.signature(text)
+        with self.lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates |= self.buckets.get(band_key, set())
+
+            now = time.monotonic()
+            best, best_result, best_score = None, None, 0.0
+            for cand_id in candidates:
+                cand = self.docs.get(cand_id)
+                result = self._live_result(cand, key, now) if cand else None
+                if result is None:
+                    continue
+                score = sum(x == y for x, y in zip(signature, cand["signature"])) / self.NUM_PERM
+                if score > best_score:
+                    best, best_result, best_score = cand_id, result, score
+
+            if best is not None and best_score >= self.threshold:
+                self.docs.move_to_end(best)
+                return best_result, best_score, signature
+        return None, 0.0, signature
+
+    def store(self, text, key, result, signature=None):
+        """Remember `result` as the `key` output generated for this document"""
+        doc_id = self.doc_id(text)
+        with self.lock:
+            doc = self.docs.get(doc_id)
+            if doc:
+                doc["results"][key] = (result, time.monotonic())
+                self.docs.move_to_end(doc_id)
+                return
+
+        if signature is None:
+            signature = self.signature(text)
+        with self.lock:
+            if doc_id in self.docs:
+                self.docs[doc_id]["results"][key] = (result, time.monotonic())
+                return
+            self.docs[doc_id] = {"signature": signature, "results": {key: (result, time.monotonic())}}
+            for band_key in self._band_keys(signature):
+                self.buckets.setdefault(band_key, set()).add(doc_id)
+
+            while len(self.docs) > self.max_docs:
+                old_id, old = self.docs.popitem(last=False)
+                for band_key in self._band_keys(old["signature"]):
+                    members = self.buckets.get(band_key)
+                    if members:
+                        members.discard(old_id)
+                        if not members:
+                            del self.buckets[band_key]
+
+similarity_index = SimilarityIndex(DEDUP_THRESHOLD, DEDUP_MAX_DOCS, DEDUP_TTL)
+
+# Characters of document text each prompt reads; reuse is judged on the same window
+PROMPT_TEXT_LIMITS = {
+    "topics": 10000,
+    "summary": 15000,
+}
+
+def reuse_key(kind, provider, model_id):
+    """Results are only reused for the same kind of output, provider and model"""
+    return (kind, provider or "", model_id or "")
+
+def find_reusable(kind, text_content, provider, model_id):
+    """Look up a stored result for this document's prompt window or a near-duplicate.
+    Returns (result, similarity, signature); pass the signature on to remember_result."""
+    window = text_content[:PROMPT_TEXT_LIMITS[kind]]
+    return similarity_index.lookup(window, reuse_key(kind, provider, model_id))
+
+def remember_result(kind, text_content, provider, model_id, result, signature=None):
+    window = text_content[:PROMPT_TEXT_LIMITS[kind]]
+    similarity_index.store(window, reuse_key(kind, provider, model_id), result, signature)
+
+def extract_topics(text_content, provider=None, model_id=None, background=False):
+    """Ask the AI for the key topics of the text and parse them into a list"""
+    prompt = f"""Extract the 5 most important topics from the text below.
+Return ONLY valid JSON:
+
+[
+  {{ "topic": "Topic Name", "description": "One sentence description" }}
+]
+
+Text:
+{text_content[:PROMPT_TEXT_LIMITS["topics"]]}
+"""
+
+    # Query AI provider with fallback
+    response_text = query_ai_with_fallback(prompt, provider, model_id, background)
+
+    cleaned = response_text.strip()
+    if cleaned.startswith("```"):
+        parts = cleaned.split("```")
+        if len(parts) >= 3:
+            cleaned = parts[1]
+            if cleaned.startswith("json"):
+                cleaned = cleaned[4:]
+
+    start = cleaned.find("[")
+    end = cleaned.rfind("]")
+    if start == -1 or end == -1:
+        # Maybe it returned a single object?
+        start = cleaned.find("{")
+        end = cleaned.rfind("}")
+        if start == -1 or end == -1:
+            raise Exception("AI did not return valid JSON")
+
+        return [json.loads(cleaned[start:end + 1])]
+    return json.loads(cleaned[start:end + 1])
+
+def summarize_text(text_content, provider=None, model_id=None, background=False):
+    """Ask the AI for a short student-friendly summary of the text"""
+    prompt = f"""Summarize the following text in a concise and easy-to-understand manner for a student.
+Highlight key definitions and core concepts. 
+Limit to 3 paragraphs.
+
+Text:
+{text_content[:PROMPT_TEXT_LIMITS["summary"]]}
+"""
+
+    # Query AI provider with fallback
+    return query_ai_with_fallback(prompt, provider, model_id, background)
+
+GENERATORS = {
+    "topics": extract_topics,
+    "summary": summarize_text,
+}
+
+class Prefetcher:
+    """Speculatively generates topics and summaries on one low-priority worker.
+
+    Explicit requests are served from a finished prefetch result, attach to a
+    prefetch that is already running, or cancel one still waiting in the queue
+    and run it themselves. Queued prefetch work is dropped when the service is
+    busy with user AI calls (counted by query_ai_with_fallback via user_call).
+    """
+
+    def __init__(self, max_pending, max_load, max_results):
+        self.max_pending = max_pending
+        self.max_load = max_load
+        self.max_results = max_results
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self.jobs = {}  # (doc_id, kind, provider, model) -> Future
+        self.results = OrderedDict()  # (doc_id, kind, provider, model) -> result
+        self.active_requests = 0
+        self.lock = threading.Lock()
+
+    def submit(self, text, provider, model_id):
+        """Queue prefetch work for the text; returns the kinds that were queued"""
+        doc_id = SimilarityIndex.doc_id(text)
+        queued = []
+        with self.lock:
+            if self.active_requests >= self.max_load:
+                return queued
+            for kind in GENERATORS:
+                key = (doc_id,) + reuse_key(kind, provider, model_id)
+                if key in self.results or key in self.jobs:
+                    continue
+                if len(self.jobs) >= self.max_pending:
+                    break
+                self.jobs[key] = self.executor.submit(self._run, key, text, provider, model_id)
+                queued.append(kind)
+        return queued
+
+    def _run(self, key, text, provider, model_id):
+        kind = key[1]
+        try:
+            with self.lock:
+                if self.active_requests >= self.max_load:
+                    print(f"DEBUG: Skipping {kind} prefetch under load")
+                    return None
+
+            result, signature = None, None
+            if DEDUP_ENABLED:
+                result, _, signature = find_reusable(kind, text, provider, model_id)
+            if result is None:
+                result = GENERATORS[kind](text, provider, model_id, background=True)
+                if DEDUP_ENABLED:
+                    remember_result(kind, text, provider, model_id, result, signature)
+
+            with self.lock:
+                self.results[key] = result
+                while len(self.results) > self.max_results:
+                    self.results.popitem(last=False)
+            print(f"DEBUG: Prefetched {kind}")
+            return result
+        except Exception as e:
+            print(f"WARNING: {kind} prefetch failed: {str(e)}")
+            return None
+        finally:
+            with self.lock:
+                self.jobs.pop(key, None)
+
+    def _shed_pending(self):
+        """Drop queued prefetch work that has not started yet (lock held)"""
+        for key, future in list(self.jobs.items()):
+            if future.cancel():
+                del self.jobs[key]
+
+    @contextmanager
+    def user_call(self):
+        """Count a user-facing AI call as load for as long as it runs"""
+        with self.lock:
+            self.active_requests += 1
+            if self.active_requests >= self.max_load:
+                self._shed_pending()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.active_requests -= 1
+
+    def run(self, kind, text, provider, model_id, fresh=False):
+        """Serve an explicit request, reusing prefetched or in-flight work when possible.
+        With fresh=True any prefetched result is discarded and the AI is asked again."""
+        key = (SimilarityIndex.doc_id(text),) + reuse_key(kind, provider, model_id)
+        with self.lock:
+            if fresh:
+                self.results.pop(key, None)
+            result = self.results.get(key)
+            future = None if fresh else self.jobs.get(key)
+            if result is None and future is not None and future.cancel():
+                # Still queued: run it now at normal priority instead of waiting
+                del self.jobs[key]
+                future = None
+
+        if result is not None:
+            print(f"DEBUG: Serving prefetched {kind}")
+            return result
+        if future is not None:
+            print(f"DEBUG: Attaching to in-flight {kind} prefetch")
+            result = future.result()
+            if result is not None:
+                return result
+        return GENERATORS[kind](text, provider, model_id)
+
+prefetcher = Prefetcher(PREFETCH_MAX_PENDING, PREFETCH_MAX_LOAD, PREFETCH_MAX_RESULTS)
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -193,6 +818,22 @@ def health():
         "hasGroqKey": bool(GROQ_API_KEY)
     }), 200
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness check: startup finished and preloaded providers are initialized"""
+    is_ready = startup_state["booted"] and startup_state["preloaded"]
+    return jsonify({
+        "status": "ready" if is_ready else "starting",
+        "service": "ai-service",
+        "bootMs": round(startup_state["boot_seconds"] * 1000, 1),
+        "timingsMs": {step: round(seconds * 1000, 1) for step, seconds in STARTUP_TIMINGS},
+        "providers": {
+            "gemini": gemini_client is not None,
+            "groq": groq_client is not None,
+            "ollama": ollama_model_loaded
+        }
+    }), 200 if is_ready else 503
+
 @app.route('/ai/generate-quiz', methods=['POST'])
 def generate_quiz():
     """Generate quiz using improved pedagogical prompt"""
@@ -267,6 +908,9 @@ Text:
 
         return jsonify({"success": True, "quiz": quiz_data}), 200
 
+    except RateLimitExceeded as e:
+        print(f"Quiz generation error: {str(e)}")
+        return rate_limit_response(e)
     except Exception as e:
         print(f"Quiz generation error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -283,43 +927,26 @@ def generate_topics():
         if not text_content:
             return jsonify({"success": False, "error": "No text provided"}), 400
 
-        prompt = f"""Extract the 5 most important topics from the text below.
-Return ONLY valid JSON:
+        # "fresh" skips stored results, e.g. when the user asks to regenerate
+        fresh = bool(data.get("fresh"))
 
-[
-  {{ "topic": "Topic Name", "description": "One sentence description" }}
-]
+        signature = None
+        if DEDUP_ENABLED and not fresh:
+            topics, similarity, signature = find_reusable("topics", text_content, provider, model_id)
+            if topics is not None:
+                print(f"Reusing topics from similar document (similarity {similarity:.2f})")
+                return jsonify({"success": True, "topics": topics, "reused": True, "similarity": similarity}), 200
 
-Text:
-{text_content[:10000]}
-"""
+        topics = prefetcher.run("topics", text_content, provider, model_id, fresh)
 
-        # Query AI provider with fallback
-        response_text = query_ai_with_fallback(prompt, provider, model_id)
-
-        cleaned = response_text.strip()
-        if cleaned.startswith("```"):
-            parts = cleaned.split("```")
-            if len(parts) >= 3:
-                cleaned = parts[1]
-                if cleaned.startswith("json"):
-                    cleaned = cleaned[4:]
-
-        start = cleaned.find("[")
-        end = cleaned.rfind("]")
-        if start == -1 or end == -1:
-            # Maybe it returned a single object?
-            start = cleaned.find("{")
-            end = cleaned.rfind("}")
-            if start == -1 or end == -1:
-                raise Exception("AI did not return valid JSON")
-            
-            topics = [json.loads(cleaned[start:end + 1])]
-        else:
-            topics = json.loads(cleaned[start:end + 1])
+        if DEDUP_ENABLED:
+            remember_result("topics", text_content, provider, model_id, topics, signature)
 
         return jsonify({"success": True, "topics": topics}), 200
 
+    except RateLimitExceeded as e:
+        print(f"Topics generation error: {str(e)}")
+        return rate_limit_response(e)
     except Exception as e:
         print(f"Topics generation error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
@@ -336,23 +963,57 @@ def generate_summary():
         if not text_content:
             return jsonify({"success": False, "error": "No text provided"}), 400
 
-        prompt = f"""Summarize the following text in a concise and easy-to-understand manner for a student.
-Highlight key definitions and core concepts. 
-Limit to 3 paragraphs.
+        # "fresh" skips stored results, e.g. when the user asks to regenerate
+        fresh = bool(data.get("fresh"))
 
-Text:
-{text_content[:15000]}
-"""
+        signature = None
+        if DEDUP_ENABLED and not fresh:
+            summary, similarity, signature = find_reusable("summary", text_content, provider, model_id)
+            if summary is not None:
+                print(f"Reusing summary from similar document (similarity {similarity:.2f})")
+                return jsonify({"success": True, "summary": summary, "reused": True, "similarity": similarity}), 200
 
-        # Query AI provider with fallback
-        response_text = query_ai_with_fallback(prompt, provider, model_id)
+        summary = prefetcher.run("summary", text_content, provider, model_id, fresh)
 
-        return jsonify({"success": True, "summary": response_text}), 200
+        if DEDUP_ENABLED:
+            remember_result("summary", text_content, provider, model_id, summary, signature)
 
+        return jsonify({"success": True, "summary": summary}), 200
+
+    except RateLimitExceeded as e:
+        print(f"Summary generation error: {str(e)}")
+        return rate_limit_response(e)
     except Exception as e:
         print(f"Summary generation error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/ai/config', methods=['GET'])
+def get_config():
+    """Feature flags the frontend needs to know about"""
+    return jsonify({"success": True, "prefetchEnabled": PREFETCH_ENABLED}), 200
+
+@app.route('/ai/prefetch', methods=['POST'])
+def prefetch():
+    """Start background topic and summary generation for a freshly parsed document"""
+    try:
+        data = request.get_json(force=True)
+        text_content = data.get("text", "")
+        provider = data.get("provider", "gemini")
+        model_id = data.get("model")
+
+        if not text_content:
+            return jsonify({"success": False, "error": "No text provided"}), 400
+
+        if not PREFETCH_ENABLED:
+            return jsonify({"success": True, "queued": []}), 200
+
+        queued = prefetcher.submit(text_content, provider, model_id)
+        return jsonify({"success": True, "queued": queued}), 202
+
+    except Exception as e:
+        print(f"Prefetch error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/ai/explain-topic', methods=['POST'])
 def explain_topic():
     """Explain a specific topic in detail based on the text context"""
@@ -379,10 +1040,51 @@ Context Text:
 
         return jsonify({"success": True, "explanation": response_text}), 200
 
+    except RateLimitExceeded as e:
+        print(f"Topic explanation error: {str(e)}")
+        return rate_limit_response(e)
     except Exception as e:
         print(f"Topic explanation error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+# ==================== STARTUP ====================
+startup_state = {"booted": False, "preloaded": not PRELOAD_PROVIDERS, "boot_seconds": 0.0}
+
+PROVIDER_INITIALIZERS = {
+    "gemini": get_gemini_client,
+    "groq": get_groq_client,
+    "ollama": preload_ollama_model,
+}
+
+def preload_providers():
+    """Initialize the providers listed in PRELOAD_PROVIDERS off the request path"""
+    started = time.perf_counter()
+    first_step = len(STARTUP_TIMINGS)
+    for name in PRELOAD_PROVIDERS:
+        initializer = PROVIDER_INITIALIZERS.get(name)
+        if not initializer:
+            continue
+        try:
+            initializer()
+        except Exception as e:
+            print(f"WARNING: Preloading {name} failed: {str(e)}")
+    startup_state["preloaded"] = True
+    # The boot report has already been printed; add the steps recorded since
+    print_startup_report("AI Service provider preload", time.perf_counter() - started, first_step)
+
+def print_startup_report(title="AI Service startup", seconds=None, first_step=0):
+    if seconds is None:
+        seconds = startup_state["boot_seconds"]
+    print(f"{title}: {seconds * 1000:.0f} ms")
+    for step, step_seconds in STARTUP_TIMINGS[first_step:]:
+        print(f"   {step}: {step_seconds * 1000:.1f} ms")
+
+startup_state["boot_seconds"] = time.perf_counter() - BOOT_STARTED
+startup_state["booted"] = True
+print_startup_report()
+if PRELOAD_PROVIDERS:
+    threading.Thread(target=preload_providers, name="preload-providers", daemon=True).start()
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5003))
     print(f"AI Service running on port {port}")
@@ -0,0 +1,296 @@
+import json
+import random
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import app as ai
+
+KEY = ai.reuse_key("summary", "gemini", "gemini-2.5-flash")
+
+
+def make_text(seed, words=600):
+    """Deterministic lecture-like text with a decent vocabulary"""
+    rng = random.Random(seed)
+    vocab = [f"term{i}" for i in range(400)]
+    return " ".join(rng.choice(vocab) for _ in range(words))
+
+
+def edit_words(text, every):
+    """Replace every `every`-th word to make a near (or not so near) copy"""
+    words = text.split()
+    for i in range(0, len(words), every):
+        words[i] = f"edited{i}"
+    return " ".join(words)
+
+
+class SimilarityIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ai.SimilarityIndex(threshold=0.85, max_docs=10, ttl=3600)
+        self.text = make_text(1)
+        self.index.store(self.text, KEY, "original summary")
+
+    def test_exact_hit(self):
+        result, similarity, _ = self.index.lookup(self.text, KEY)
+
+        self.assertEqual(result, "original summary")
+        self.assertEqual(similarity, 1.0)
+
+    def test_near_duplicate_hit_above_threshold(self):
+        near = edit_words(self.text, 100)
+
+        result, similarity, _ = self.index.lookup(near, KEY)
+
+        self.assertEqual(result, "original summary")
+        self.assertGreaterEqual(similarity, 0.85)
+        self.assertLess(similarity, 1.0)
+
+    def test_miss_below_threshold(self):
+        heavily_edited = edit_words(self.text, 3)
+
+        result, _, signature = self.index.lookup(heavily_edited, KEY)
+
+        self.assertIsNone(result)
+        self.assertIsNotNone(signature)
+
+    def test_unrelated_text_misses(self):
+        result, _, _ = self.index.lookup(make_text(2), KEY)
+
+        self.assertIsNone(result)
+
+    def test_results_are_isolated_by_provider_and_model(self):
+        other_model = ai.reuse_key("summary", "gemini", "gemini-2.5-pro")
+        other_provider = ai.reuse_key("summary", "groq", "gemini-2.5-flash")
+        other_kind = ai.reuse_key("topics", "gemini", "gemini-2.5-flash")
+
+        for key in (other_model, other_provider, other_kind):
+            self.assertIsNone(self.index.lookup(self.text, key)[0])
+            self.assertIsNone(self.index.lookup(edit_words(self.text, 100), key)[0])
+
+    def test_expired_results_are_not_reused(self):
+        stored_at = ai.time.monotonic()
+
+        with mock.patch.object(ai.time, "monotonic", return_value=stored_at + 3601):
+            self.assertIsNone(self.index.lookup(self.text, KEY)[0])
+            self.assertIsNone(self.index.lookup(edit_words(self.text, 100), KEY)[0])
+
+    def test_store_overwrites_existing_result(self):
+        self.index.store(self.text, KEY, "regenerated summary")
+
+        self.assertEqual(self.index.lookup(self.text, KEY)[0], "regenerated summary")
+
+
+class FreshRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(ai, "similarity_index", ai.SimilarityIndex()),
+            mock.patch.object(ai, "prefetcher", ai.Prefetcher(max_pending=0, max_load=2, max_results=10)),
+            mock.patch.object(ai, "DEDUP_ENABLED", True),
+            mock.patch.dict(ai.GENERATORS, {"topics": lambda *args, **kwargs: "topics from AI"}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = ai.app.test_client()
+        self.text = make_text(3)
+
+    def post(self, **extra):
+        return self.client.post("/ai/generate-topics", json={
+            "text": self.text, "provider": "gemini", "model": "gemini-2.5-flash", **extra,
+        }).get_json()
+
+    def test_fresh_skips_stored_result(self):
+        ai.similarity_index.store(self.text, ai.reuse_key("topics", "gemini", "gemini-2.5-flash"), "stale topics")
+
+        self.assertEqual(self.post()["topics"], "stale topics")
+        self.assertEqual(self.post(fresh=True)["topics"], "topics from AI")
+        self.assertEqual(self.post()["topics"], "topics from AI")
+
+
+
+class BackgroundAdmissionTest(unittest.TestCase):
+    """Prefetch (background) calls may only use spare provider capacity"""
+
+    def setUp(self):
+        limits = {
+            "roomy": {"rpm": 0, "burst": 1, "concurrency": 2},
+            "single": {"rpm": 0, "burst": 1, "concurrency": 1, "max_queue": 4, "max_wait": 5},
+            "metered": {"rpm": 60, "burst": 2, "concurrency": 4},
+        }
+        patches = [
+            mock.patch.object(ai, "PROVIDER_LIMITS", limits),
+            mock.patch.object(ai, "provider_buckets", {n: ai.TokenBucket(l["rpm"], l["burst"]) for n, l in limits.items()}),
+            mock.patch.object(ai, "provider_semaphores", {n: threading.BoundedSemaphore(l["concurrency"]) for n, l in limits.items()}),
+            mock.patch.object(ai, "provider_waiting", {n: 0 for n in limits}),
+            mock.patch.object(ai, "provider_active", {n: 0 for n in limits}),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_background_leaves_the_last_slot(self):
+        with ai.provider_slot("roomy"):
+            with self.assertRaises(ai.RateLimitExceeded):
+                with ai.provider_slot("roomy", background=True):
+                    pass
+
+        with ai.provider_slot("roomy", background=True):
+            with ai.provider_slot("roomy"):
+                pass
+
+    def test_background_never_takes_a_single_slot(self):
+        with self.assertRaises(ai.RateLimitExceeded):
+            with ai.provider_slot("single", background=True):
+                pass
+
+    def test_background_does_not_jump_a_waiting_user(self):
+        release = threading.Event()
+        user_admitted = threading.Event()
+
+        def holder():
+            with ai.provider_slot("roomy"):
+                release.wait(5)
+
+        def waiting_user():
+            with ai.provider_slot("roomy"):
+                user_admitted.set()
+
+        threads = [threading.Thread(target=holder), threading.Thread(target=holder)]
+        for thread in threads:
+            thread.start()
+        while ai.provider_active["roomy"] < 2:
+            time.sleep(0.01)
+        user = threading.Thread(target=waiting_user)
+        user.start()
+        while not ai.provider_waiting["roomy"]:
+            time.sleep(0.01)
+
+        with self.assertRaises(ai.RateLimitExceeded):
+            with ai.provider_slot("roomy", background=True):
+                pass
+
+        release.set()
+        for thread in threads + [user]:
+            thread.join(5)
+        self.assertTrue(user_admitted.is_set())
+
+    def test_background_keeps_a_spare_token(self):
+        with ai.provider_slot("metered", background=True):
+            pass
+
+        with self.assertRaises(ai.RateLimitExceeded):
+            with ai.provider_slot("metered", background=True):
+                pass
+        with ai.provider_slot("metered"):
+            pass
+
+    def test_user_calls_count_as_prefetch_load(self):
+        prefetcher = ai.Prefetcher(max_pending=4, max_load=1, max_results=10)
+        seen_load = []
+
+        def fake_providers(*args, **kwargs):
+            seen_load.append(prefetcher.active_requests)
+            return "answer"
+
+        with mock.patch.object(ai, "prefetcher", prefetcher), \
+                mock.patch.object(ai, "query_providers", side_effect=fake_providers):
+            ai.query_ai_with_fallback("explain", "gemini")
+            ai.query_ai_with_fallback("prefetch", "gemini", background=True)
+
+        self.assertEqual(seen_load, [1, 0])
+        self.assertEqual(prefetcher.active_requests, 0)
+
+
+
+class OllamaStandIn:
+    """Local /api/generate that streams `chunks` as NDJSON, sleeping `delays[i]` before chunk i"""
+
+    def __init__(self):
+        self.chunks = []
+        self.delays = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                self.wfile.flush()
+                try:
+                    for i, chunk in enumerate(stand_in.chunks):
+                        time.sleep(stand_in.delays[i] if i < len(stand_in.delays) else 0)
+                        line = json.dumps(chunk).encode() + b"\n"
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class QueryOllamaTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stand_in = OllamaStandIn()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stand_in.close()
+
+    def setUp(self):
+        self.stand_in.delays = []
+        patches = [
+            mock.patch.object(ai, "OLLAMA_BASE_URL", self.stand_in.url),
+            mock.patch.object(ai, "OLLAMA_READ_TIMEOUT", 0.3),
+            mock.patch.object(ai, "OLLAMA_FIRST_CHUNK_TIMEOUT", 2),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_complete_stream_is_joined(self):
+        self.stand_in.chunks = [{"response": "Hel"}, {"response": "lo"}, {"response": "", "done": True}]
+
+        self.assertEqual(ai.query_ollama("prompt", "test-model"), "Hello")
+
+    def test_stream_without_done_is_an_error(self):
+        self.stand_in.chunks = [{"response": "Hel"}, {"response": "lo"}]
+
+        with self.assertRaisesRegex(Exception, "ended before the response was complete"):
+            ai.query_ollama("prompt", "test-model")
+
+    def test_slow_first_chunk_uses_the_first_chunk_timeout(self):
+        self.stand_in.chunks = [{"response": "Hi"}, {"response": "", "done": True}]
+        self.stand_in.delays = [0.8]
+
+        self.assertEqual(ai.query_ollama("prompt", "test-model"), "Hi")
+
+    def test_stall_after_first_chunk_uses_the_read_timeout(self):
+        self.stand_in.chunks = [{"response": "Hi"}, {"response": "", "done": True}]
+        self.stand_in.delays = [0, 1.0]
+
+        with self.assertRaisesRegex(Exception, "stream stalled"):
+            ai.query_ollama("prompt", "test-model")
+
+
+if __name__ == "__main__":
+    unittest.main()
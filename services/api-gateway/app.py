@@ -1,7 +1,13 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, jsonify, request, send_from_directory
 from flask_cors import CORS
+from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
+import jwt
 import requests
 import os
+import hashlib
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -9,12 +15,322 @@ load_dotenv()
 app = Flask(__name__, static_folder=None)
 CORS(app)
 
+# Number of reverse proxies in front of the gateway whose X-Forwarded-For hop we trust.
+# Leave at 0 when clients connect directly, otherwise they could pick their own IP.
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
+
 # Service URLs
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://localhost:5001")
 FILE_PARSER_SERVICE_URL = os.getenv("FILE_PARSER_SERVICE_URL", "http://localhost:5002")
 AI_SERVICE_URL = os.getenv("AI_SERVICE_URL", "http://localhost:5003")
 FRONTEND_SERVICE_URL = os.getenv("FRONTEND_SERVICE_URL", "http://localhost:5004")
 
+# Token Verification (Google ID tokens verified in-process)
+JWKS_URL = os.getenv("JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE") or os.getenv("GOOGLE_CLIENT_ID")
+JWT_ISSUERS = [i.strip() for i in os.getenv("JWT_ISSUERS", "accounts.google.com,https://accounts.google.com").split(",") if i.strip()]
+JWT_ALGORITHMS = ["RS256", "ES256"]
+# Reject unauthenticated /api/* calls (except the routes needed to sign in).
+# The bundled frontend only holds OAuth access tokens and sends no ID token to /api/*,
+# so enabling this makes every AI and parse call from the current UI fail with 401.
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() == "true"
+AUTH_EXEMPT_PATHS = {"/api/config", "/api/auth/verify"}
+JWKS_DEFAULT_MAX_AGE = 3600
+JWKS_MIN_REFRESH_INTERVAL = 60
+JWKS_FETCH_TIMEOUT = 5
+TOKEN_CACHE_MAX_ENTRIES = 10000
+
+# Rate Limiting (requests per minute; 0 disables a limit)
+RATE_LIMIT_USER_PER_MIN = float(os.getenv("RATE_LIMIT_USER_PER_MIN", 10))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", 5))
+RATE_LIMIT_GLOBAL_PER_MIN = float(os.getenv("RATE_LIMIT_GLOBAL_PER_MIN", 120))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", 20))
+# Longest a request may queue for a token before being rejected with 429.
+# Defaults to two per-user refill intervals so a user past their burst can still queue.
+# Set it to 0 to reject with 429 immediately instead of queueing.
+if os.getenv("RATE_LIMIT_MAX_WAIT") is not None:
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT"))
+else:
+    RATE_LIMIT_MAX_WAIT = 2 * 60 / RATE_LIMIT_USER_PER_MIN if RATE_LIMIT_USER_PER_MIN > 0 else 5
+RATE_LIMIT_MAX_TRACKED_USERS = 10000
+# Prefetch has its own per-user bucket and never queues, so it cannot use up a user's AI requests
+RATE_LIMIT_PREFETCH_PER_MIN = float(os.getenv("RATE_LIMIT_PREFETCH_PER_MIN", 6))
+RATE_LIMIT_PREFETCH_BURST = float(os.getenv("RATE_LIMIT_PREFETCH_BURST", 2))
+
+class TokenBucket:
+    """Thread-safe token bucket. Tokens may be reserved ahead of time, which
+    turns the bucket into a bounded wait queue: a caller is only admitted if
+    its token will be available within max_wait seconds."""
+
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, max_wait=0, spare=0):
+        """Reserve one token, leaving at least `spare` tokens for other callers.
+
+        Returns (True, wait) when admitted - the caller must sleep `wait` seconds
+        before proceeding - or (False, retry_after) when the queue is full.
+        """
+        if self.rate <= 0:
+            return True, 0
+        with self.lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (1 + spare - self.tokens) / self.rate)
+            if wait > max_wait:
+                return False, wait
+            self.tokens -= 1
+            return True, wait
+
+    def refund(self):
+        """Give back a token reserved by a request that was rejected elsewhere"""
+        if self.rate <= 0:
+            return
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_idle(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+global_bucket = TokenBucket(RATE_LIMIT_GLOBAL_PER_MIN, RATE_LIMIT_GLOBAL_BURST)
+user_buckets = {}
+user_buckets_lock = threading.Lock()
+
+def client_key():
+    """Identify the caller: verified user if any, otherwise client IP.
+    Unverified tokens and forwarded headers are client-controlled, so they are not used."""
+    user = getattr(g, "user", None)
+    if user and user.get("sub"):
+        return f"user:{user['sub']}"
+    return f"ip:{request.remote_addr}"
+
+def get_user_bucket(key, rate_per_min=RATE_LIMIT_USER_PER_MIN, burst=RATE_LIMIT_USER_BURST):
+    with user_buckets_lock:
+        bucket = user_buckets.get(key)
+        if bucket is None:
+            if len(user_buckets) >= RATE_LIMIT_MAX_TRACKED_USERS:
+                # Forget users whose buckets have fully refilled
+                for k in [k for k, b in user_buckets.items() if b.is_idle()]:
+                    del user_buckets[k]
+            bucket = TokenBucket(rate_per_min, burst)
+            user_buckets[key] = bucket
+        return bucket
+
+def too_many_requests(retry_after, message):
+    retry_after = max(1, int(retry_after + 0.999))
+    response = jsonify({"success": False, "error": message, "retryAfter": retry_after})
+    response.headers["Retry-After"] = str(retry_after)
+    return response, 429
+
+def rate_limited(f):
+    """Admit the request through the per-user and global token buckets"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        key = client_key()
+        user_bucket = get_user_bucket(key)
+        granted, user_wait = user_bucket.reserve(RATE_LIMIT_MAX_WAIT)
+        if not granted:
+            return too_many_requests(user_wait, "Too many AI requests. Please wait a moment and try again.")
+
+        granted, global_wait = global_bucket.reserve(RATE_LIMIT_MAX_WAIT)
+        if not granted:
+            user_bucket.refund()
+            return too_many_requests(global_wait, "AceNow is busy right now. Please try again shortly.")
+
+        wait = max(user_wait, global_wait)
+        if wait > 0:
+            print(f"DEBUG: Queuing request from {key} for {wait:.2f}s")
+            time.sleep(wait)
+        return f(*args, **kwargs)
+    return wrapper
+
+def background_rate_limited(f):
+    """Admit background work (prefetch) only when it costs nobody a wait:
+    it uses a separate per-user bucket and a spare global token, and never queues"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        bucket = get_user_bucket(f"prefetch:{client_key()}", RATE_LIMIT_PREFETCH_PER_MIN, RATE_LIMIT_PREFETCH_BURST)
+        granted, retry_after = bucket.reserve(0)
+        if not granted:
+            return too_many_requests(retry_after, "Too many prefetch requests.")
+
+        granted, retry_after = global_bucket.reserve(0, spare=1)
+        if not granted:
+            bucket.refund()
+            return too_many_requests(retry_after, "AceNow is busy right now; skipping prefetch.")
+        return f(*args, **kwargs)
+    return wrapper
+
+def proxy_json(response):
+    """Relay an upstream JSON response, keeping its Retry-After backpressure hint"""
+    headers = {}
+    if 'Retry-After' in response.headers:
+        headers['Retry-After'] = response.headers['Retry-After']
+    return jsonify(response.json()), response.status_code, headers
+
+class AuthError(Exception):
+    """Raised when a bearer token cannot be verified"""
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, cached for as long as its Cache-Control allows"""
+
+    def __init__(self, url):
+        self.url = url
+        self.keys = {}
+        self.expires_at = 0.0
+        self.fetched_at = None  # monotonic time of the last fetch attempt
+        self.refreshing = False
+        self.lock = threading.Lock()
+        self.refreshed = threading.Condition(self.lock)
+
+    def _fetch(self):
+        """Download the key set; returns (keys, max_age) or None on failure"""
+        try:
+            response = requests.get(self.url, timeout=JWKS_FETCH_TIMEOUT)
+            response.raise_for_status()
+            keys = {}
+            for jwk in response.json().get("keys", []):
+                try:
+                    keys[jwk.get("kid")] = jwt.PyJWK(jwk)
+                except jwt.PyJWTError as e:
+                    print(f"WARNING: Skipping unusable signing key {jwk.get('kid')}: {str(e)}")
+        except Exception as e:
+            print(f"WARNING: Failed to fetch signing keys from {self.url}: {str(e)}")
+            return None
+
+        max_age = JWKS_DEFAULT_MAX_AGE
+        for directive in response.headers.get("Cache-Control", "").split(","):
+            name, _, value = directive.strip().partition("=")
+            if name.lower() == "max-age" and value.isdigit():
+                max_age = int(value)
+        print(f"DEBUG: Loaded {len(keys)} signing keys (cached for {max_age}s)")
+        return keys, max_age
+
+    def get_key(self, kid):
+        with self.lock:
+            now = time.monotonic()
+            # Refetch when the keys expired or an unknown kid suggests rotation, but at most
+            # once per JWKS_MIN_REFRESH_INTERVAL (failed attempts included) and by one caller
+            # at a time. Others keep using the current keys meanwhile, or wait for the
+            # refresh if they need a key that is not cached yet.
+            due = self.fetched_at is None or now - self.fetched_at >= JWKS_MIN_REFRESH_INTERVAL
+            refresh = due and not self.refreshing and (now >= self.expires_at or kid not in self.keys)
+            if refresh:
+                self.refreshing = True
+                self.fetched_at = now
+            key = self.keys.get(kid)
+            if key is None and not refresh and self.refreshing:
+                self.refreshed.wait_for(lambda: not self.refreshing, timeout=JWKS_FETCH_TIMEOUT)
+                key = self.keys.get(kid)
+
+        if refresh:
+            fetched = None
+            try:
+                fetched = self._fetch()
+            finally:
+                with self.lock:
+                    self.refreshing = False
+                    if fetched:
+                        self.keys, max_age = fetched
+                        self.expires_at = now + max_age
+                    key = self.keys.get(kid)
+                    self.refreshed.notify_all()
+
+        if key is None:
+            raise AuthError("Token signed with an unknown key")
+        return key
+
+jwks_cache = JWKSCache(JWKS_URL)
+token_cache = {}
+token_cache_lock = threading.Lock()
+jwt_audience = JWT_AUDIENCE
+audience_checked_at = None
+
+def get_audience():
+    """Client ID tokens must be issued for; falls back to the auth service's config,
+    asked at most once per JWKS_MIN_REFRESH_INTERVAL while it is unset"""
+    global jwt_audience, audience_checked_at
+    if jwt_audience:
+        return jwt_audience
+
+    now = time.monotonic()
+    if audience_checked_at is not None and now - audience_checked_at < JWKS_MIN_REFRESH_INTERVAL:
+        raise AuthError("Token audience not configured")
+    audience_checked_at = now
+    try:
+        response = requests.get(f"{AUTH_SERVICE_URL}/auth/config", timeout=2)
+        jwt_audience = response.json().get("clientId")
+    except Exception as e:
+        raise AuthError(f"Token audience not configured: {str(e)}")
+    if not jwt_audience:
+        raise AuthError("Token audience not configured")
+    return jwt_audience
+
+def verify_jwt(token):
+    """Verify an ID token locally and return its claims (memoized until expiry)"""
+    cache_key = hashlib.sha256(token.encode()).hexdigest()
+    with token_cache_lock:
+        claims = token_cache.get(cache_key)
+    if claims and claims["exp"] > time.time():
+        return claims
+
+    try:
+        header = jwt.get_unverified_header(token)
+        key = jwks_cache.get_key(header.get("kid"))
+        claims = jwt.decode(
+            token,
+            key.key,
+            algorithms=JWT_ALGORITHMS,
+            audience=get_audience(),
+            options={"require": ["exp", "iat", "iss", "aud"]}
+        )
+    except jwt.PyJWTError as e:
+        raise AuthError(f"Invalid token: {str(e)}")
+    if claims.get("iss") not in JWT_ISSUERS:
+        raise AuthError("Invalid token: untrusted issuer")
+
+    with token_cache_lock:
+        if len(token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+            now = time.time()
+            for k in [k for k, c in token_cache.items() if c["exp"] <= now]:
+                del token_cache[k]
+            if len(token_cache) >= TOKEN_CACHE_MAX_ENTRIES:
+                token_cache.clear()
+        token_cache[cache_key] = claims
+    return claims
+
+@app.before_request
+def authenticate():
+    """Attach the verified user (if any) to the request for every /api/* route"""
+    g.user = None
+    if not request.path.startswith("/api/") or request.method == "OPTIONS":
+        return None
+
+    required = AUTH_REQUIRED and request.path not in AUTH_EXEMPT_PATHS
+    auth_header = request.headers.get("Authorization", "")
+    if not auth_header.startswith("Bearer "):
+        if required:
+            return jsonify({"success": False, "error": "Authentication required"}), 401
+        return None
+
+    try:
+        g.user = verify_jwt(auth_header[7:])
+    except AuthError as e:
+        if required:
+            return jsonify({"success": False, "error": str(e)}), 401
+    return None
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check for API Gateway"""
@@ -46,24 +362,45 @@ def health():
 # ==================== AUTH ROUTES ====================
 @app.route('/api/config', methods=['GET'])
 def get_config():
-    """Get authentication configuration"""
+    """Get authentication configuration plus AI feature flags"""
     try:
         response = requests.get(f"{AUTH_SERVICE_URL}/auth/config")
-        return jsonify(response.json()), response.status_code
+        config = response.json()
     except Exception as e:
         return jsonify({"success": False, "error": f"Auth service unavailable: {str(e)}"}), 503
 
+    try:
+        ai_config = requests.get(f"{AI_SERVICE_URL}/ai/config", timeout=2).json()
+        config["prefetchEnabled"] = bool(ai_config.get("prefetchEnabled"))
+    except Exception as e:
+        print(f"DEBUG: AI config unavailable: {str(e)}")
+        config["prefetchEnabled"] = False
+    return jsonify(config), response.status_code
+
 @app.route('/api/auth/verify', methods=['POST'])
 def verify_token():
     """Verify authentication token"""
     try:
-        response = requests.post(
-            f"{AUTH_SERVICE_URL}/auth/verify",
-            json=request.get_json()
-        )
-        return jsonify(response.json()), response.status_code
+        data = request.get_json(silent=True) or {}
+        token = data.get('token')
+
+        if not token:
+            return jsonify({"success": False, "error": "No token provided"}), 400
+
+        claims = verify_jwt(token)
+        return jsonify({
+            "success": True,
+            "user": {
+                "id": claims.get("sub"),
+                "email": claims.get("email"),
+                "name": claims.get("name"),
+                "picture": claims.get("picture")
+            }
+        }), 200
+    except AuthError as e:
+        return jsonify({"success": False, "error": str(e)}), 401
     except Exception as e:
-        return jsonify({"success": False, "error": f"Auth service unavailable: {str(e)}"}), 503
+        return jsonify({"success": False, "error": str(e)}), 500
 
 # ==================== FILE PARSER ROUTES ====================
 @app.route('/api/parse-file', methods=['POST'])
@@ -80,8 +417,21 @@ def parse_file():
     except Exception as e:
         return jsonify({"success": False, "error": f"File parser service unavailable: {str(e)}"}), 503
 
+@app.route('/api/build-corpus', methods=['POST'])
+def build_corpus():
+    """Merge parsed documents into a deduplicated course corpus"""
+    try:
+        response = requests.post(
+            f"{FILE_PARSER_SERVICE_URL}/build-corpus",
+            json=request.get_json()
+        )
+        return jsonify(response.json()), response.status_code
+    except Exception as e:
+        return jsonify({"success": False, "error": f"File parser service unavailable: {str(e)}"}), 503
+
 # ==================== AI ROUTES ====================
 @app.route('/api/generate-quiz', methods=['POST'])
+@rate_limited
 def generate_quiz():
     """Generate quiz from text"""
     try:
@@ -89,11 +439,12 @@ def generate_quiz():
             f"{AI_SERVICE_URL}/ai/generate-quiz",
             json=request.get_json()
         )
-        return jsonify(response.json()), response.status_code
+        return proxy_json(response)
     except Exception as e:
         return jsonify({"success": False, "error": f"AI service unavailable: {str(e)}"}), 503
 
 @app.route('/api/generate-topics', methods=['POST'])
+@rate_limited
 def generate_topics():
     """Generate key topics from text"""
     try:
@@ -101,11 +452,12 @@ def generate_topics():
             f"{AI_SERVICE_URL}/ai/generate-topics",
             json=request.get_json()
         )
-        return jsonify(response.json()), response.status_code
+        return proxy_json(response)
     except Exception as e:
         return jsonify({"success": False, "error": f"AI service unavailable: {str(e)}"}), 503
 
 @app.route('/api/generate-summary', methods=['POST'])
+@rate_limited
 def generate_summary():
     """Generate summary from text"""
     try:
@@ -113,11 +465,12 @@ def generate_summary():
             f"{AI_SERVICE_URL}/ai/generate-summary",
             json=request.get_json()
         )
-        return jsonify(response.json()), response.status_code
+        return proxy_json(response)
     except Exception as e:
         return jsonify({"success": False, "error": f"AI service unavailable: {str(e)}"}), 503
 
 @app.route('/api/explain-topic', methods=['POST'])
+@rate_limited
 def explain_topic():
     """Explain a specific topic in detail"""
     try:
@@ -125,7 +478,21 @@ def explain_topic():
             f"{AI_SERVICE_URL}/ai/explain-topic",
             json=request.get_json()
         )
-        return jsonify(response.json()), response.status_code
+        return proxy_json(response)
+    except Exception as e:
+        return jsonify({"success": False, "error": f"AI service unavailable: {str(e)}"}), 503
+
+@app.route('/api/prefetch', methods=['POST'])
+@background_rate_limited
+def prefetch():
+    """Let the AI service start topics/summary in the background"""
+    try:
+        response = requests.post(
+            f"{AI_SERVICE_URL}/ai/prefetch",
+            json=request.get_json(),
+            timeout=5
+        )
+        return proxy_json(response)
     except Exception as e:
         return jsonify({"success": False, "error": f"AI service unavailable: {str(e)}"}), 503
 
@@ -162,6 +529,8 @@ def serve_static(path):
         return f"Static file proxy error: {str(e)}", 500
 
 if __name__ == '__main__':
+    if AUTH_REQUIRED:
+        print("WARNING: AUTH_REQUIRED is on; the bundled frontend does not send ID tokens and will get 401s")
     port = int(os.getenv('PORT', 5000))
     print(f"API Gateway running on port {port}")
     print(f"   Auth Service: {AUTH_SERVICE_URL}")
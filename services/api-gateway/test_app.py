@@ -0,0 +1,218 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import app as gateway
+
+AUDIENCE = "test-client-id"
+ISSUER = "https://accounts.google.com"
+
+
+def make_key(kid):
+    """Generate an RSA key pair and its public JWK"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, alg="RS256", use="sig")
+    return private_key, jwk
+
+
+class JWKSStandIn:
+    """Local JWKS endpoint serving whatever keys the test puts in `jwks`"""
+
+    def __init__(self):
+        self.jwks = []
+        self.status = 200
+        self.hits = 0
+        self.delay = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.hits += 1
+                time.sleep(stand_in.delay)
+                body = json.dumps({"keys": stand_in.jwks}).encode()
+                self.send_response(stand_in.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", "public, max-age=300")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/certs"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class VerifyTokenTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.stand_in = JWKSStandIn()
+        cls.key1, cls.jwk1 = make_key("k1")
+        cls.key2, cls.jwk2 = make_key("k2")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.stand_in.close()
+
+    def setUp(self):
+        self.stand_in.jwks = [self.jwk1]
+        self.stand_in.status = 200
+        self.stand_in.hits = 0
+        self.stand_in.delay = 0
+        gateway.jwks_cache = gateway.JWKSCache(self.stand_in.url)
+        gateway.token_cache.clear()
+        patches = [
+            mock.patch.object(gateway, "jwt_audience", AUDIENCE),
+            mock.patch.object(gateway, "JWKS_MIN_REFRESH_INTERVAL", 60),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = gateway.app.test_client()
+
+    def make_token(self, key=None, kid="k1", **overrides):
+        now = int(time.time())
+        claims = {
+            "sub": "1234",
+            "email": "student@example.com",
+            "name": "Student",
+            "aud": AUDIENCE,
+            "iss": ISSUER,
+            "iat": now,
+            "exp": now + 600,
+        }
+        claims.update(overrides)
+        return jwt.encode(claims, key or self.key1, algorithm="RS256", headers={"kid": kid})
+
+    def test_valid_token_verifies(self):
+        response = self.client.post("/api/auth/verify", json={"token": self.make_token()})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["user"]["email"], "student@example.com")
+
+    def test_wrong_audience_is_rejected(self):
+        response = self.client.post("/api/auth/verify", json={"token": self.make_token(aud="someone-else")})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_wrong_issuer_is_rejected(self):
+        response = self.client.post("/api/auth/verify", json={"token": self.make_token(iss="https://evil.example.com")})
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_foreign_signature_is_rejected(self):
+        token = self.make_token(key=self.key2, kid="k1")
+
+        with self.assertRaises(gateway.AuthError):
+            gateway.verify_jwt(token)
+
+    def test_verified_tokens_are_memoized(self):
+        token = self.make_token()
+        gateway.verify_jwt(token)
+
+        with mock.patch.object(gateway.jwt, "decode", side_effect=AssertionError("decoded again")):
+            claims = gateway.verify_jwt(token)
+
+        self.assertEqual(claims["sub"], "1234")
+        self.assertEqual(self.stand_in.hits, 1)
+
+    def test_unknown_kid_triggers_refetch(self):
+        gateway.verify_jwt(self.make_token())
+        self.stand_in.jwks = [self.jwk1, self.jwk2]
+
+        with mock.patch.object(gateway, "JWKS_MIN_REFRESH_INTERVAL", 0):
+            claims = gateway.verify_jwt(self.make_token(key=self.key2, kid="k2"))
+
+        self.assertEqual(claims["sub"], "1234")
+        self.assertEqual(self.stand_in.hits, 2)
+
+    def test_unknown_kid_refetch_is_throttled(self):
+        gateway.verify_jwt(self.make_token())
+
+        for _ in range(3):
+            with self.assertRaises(gateway.AuthError):
+                gateway.verify_jwt(self.make_token(key=self.key2, kid="k2"))
+
+        self.assertEqual(self.stand_in.hits, 1)
+
+    def test_failed_fetch_backs_off(self):
+        self.stand_in.status = 500
+
+        for _ in range(3):
+            with self.assertRaises(gateway.AuthError):
+                gateway.verify_jwt(self.make_token())
+
+        self.assertEqual(self.stand_in.hits, 1)
+
+    def test_concurrent_first_requests_wait_for_the_fetch(self):
+        self.stand_in.delay = 0.5
+        token = self.make_token()
+        results = []
+
+        def verify():
+            try:
+                results.append(gateway.verify_jwt(token)["sub"])
+            except gateway.AuthError as e:
+                results.append(e)
+
+        threads = [threading.Thread(target=verify) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(results, ["1234"] * 5)
+        self.assertEqual(self.stand_in.hits, 1)
+
+    def test_required_auth_rejects_missing_token(self):
+        with mock.patch.object(gateway, "AUTH_REQUIRED", True):
+            response = self.client.post("/api/generate-summary", json={"text": "x"})
+
+        self.assertEqual(response.status_code, 401)
+
+
+class PrefetchRateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        gateway.user_buckets.clear()
+        patches = [
+            mock.patch.object(gateway, "global_bucket", gateway.TokenBucket(120, 20)),
+            mock.patch.object(gateway, "RATE_LIMIT_PREFETCH_PER_MIN", 6),
+            mock.patch.object(gateway, "RATE_LIMIT_PREFETCH_BURST", 2),
+            mock.patch.object(gateway.requests, "post", return_value=mock.Mock(
+                status_code=202, headers={}, json=lambda: {"success": True, "queued": []})),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = gateway.app.test_client()
+
+    def test_prefetch_has_its_own_bucket_and_never_queues(self):
+        statuses = [self.client.post("/api/prefetch", json={"text": "x"}).status_code for _ in range(3)]
+
+        self.assertEqual(statuses, [202, 202, 429])
+        user_bucket = gateway.get_user_bucket("ip:127.0.0.1")
+        self.assertTrue(user_bucket.is_idle())
+
+    def test_prefetch_leaves_the_last_global_token(self):
+        with mock.patch.object(gateway, "global_bucket", gateway.TokenBucket(60, 1)):
+            response = self.client.post("/api/prefetch", json={"text": "x"})
+
+        self.assertEqual(response.status_code, 429)
+
+
+if __name__ == "__main__":
+    unittest.main()
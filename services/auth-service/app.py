@@ -1,5 +1,7 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+from google.oauth2 import id_token
+from google.auth.transport import requests as google_requests
 import os
 from dotenv import load_dotenv
 
@@ -34,13 +36,18 @@ def verify_token():
         if not token:
             return jsonify({"success": False, "error": "No token provided"}), 400
         
-        # In production, verify the token with Google
-        # For now, we'll accept any token for development
+        try:
+            claims = id_token.verify_oauth2_token(token, google_requests.Request(), GOOGLE_CLIENT_ID)
+        except ValueError as e:
+            return jsonify({"success": False, "error": f"Invalid token: {str(e)}"}), 401
+
         return jsonify({
             "success": True,
             "user": {
-                "email": "user@example.com",
-                "name": "User"
+                "id": claims.get("sub"),
+                "email": claims.get("email"),
+                "name": claims.get("name"),
+                "picture": claims.get("picture")
             }
         }), 200
         
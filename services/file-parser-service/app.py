@@ -1,9 +1,12 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 import pdfplumber
-from pptx import Presentation
 import os
 import re
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from collections import Counter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,6 +30,239 @@ def clean_extracted_text(text):
     text = re.sub(r'\s+', ' ', text).strip()
     return text
 
+# ==================== PPTX EXTRACTION ====================
+# Slides are read straight from the zip with an incremental XML parser so that
+# media parts (images, video) are never loaded. Tags are matched by local name,
+# which covers both transitional and strict OOXML namespaces.
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def _read_rels(zf, part):
+    """Map relationship ids of an OOXML part to (type, target part name)"""
+    folder, name = posixpath.split(part)
+    rels_part = posixpath.join(folder, "_rels", name + ".rels")
+    rels = {}
+    try:
+        stream = zf.open(rels_part)
+    except KeyError:
+        return rels
+    with stream:
+        for _, elem in ET.iterparse(stream):
+            if _local_name(elem.tag) != "Relationship" or elem.get("TargetMode") == "External":
+                continue
+            target = elem.get("Target", "")
+            if target.startswith("/"):
+                target = target.lstrip("/")
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            rels[elem.get("Id")] = (elem.get("Type", "").rsplit("/", 1)[-1], target)
+    return rels
+
+def _iter_paragraphs(zf, part):
+    """Yield the text of each paragraph in a slide or notes part, in document order.
+    Tables and grouped shapes are covered because their cells hold ordinary paragraphs."""
+    with zf.open(part) as stream:
+        runs = []
+        in_slide_number = False
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            tag = _local_name(elem.tag)
+            if event == "start":
+                if tag == "fld" and elem.get("type") == "slidenum":
+                    in_slide_number = True
+                continue
+
+            if tag == "t":
+                if not in_slide_number:
+                    runs.append(elem.text or "")
+            elif tag == "br":
+                runs.append(" ")
+            elif tag == "fld":
+                in_slide_number = False
+            elif tag == "p":
+                text = "".join(runs).strip()
+                if text:
+                    yield text
+                runs = []
+                elem.clear()
+
+def extract_pptx_slides(file, include_notes=True):
+    """Return the text of each slide (followed by its speaker notes) in slide order"""
+    slides = []
+    with zipfile.ZipFile(file) as zf:
+        root_rels = _read_rels(zf, "")
+        presentation = next(
+            (target for rel_type, target in root_rels.values() if rel_type == "officeDocument"),
+            "ppt/presentation.xml"
+        )
+        pres_rels = _read_rels(zf, presentation)
+
+        slide_parts = []
+        with zf.open(presentation) as stream:
+            for _, elem in ET.iterparse(stream):
+                if _local_name(elem.tag) != "sldId":
+                    continue
+                rel_id = next((v for k, v in elem.attrib.items() if _local_name(k) == "id" and k.startswith("{")), None)
+                if rel_id in pres_rels:
+                    slide_parts.append(pres_rels[rel_id][1])
+
+        for slide_part in slide_parts:
+            lines = list(_iter_paragraphs(zf, slide_part))
+            if include_notes:
+                for rel_type, target in _read_rels(zf, slide_part).values():
+                    if rel_type == "notesSlide":
+                        lines.extend(_iter_paragraphs(zf, target))
+            slides.append("\n".join(lines))
+    return slides
+
+def clean_page_text(text):
+    """Clean a single page/slide while keeping its line structure"""
+    if not text:
+        return ""
+    lines = (clean_extracted_text(line) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+# Corpus Builder Configuration
+# A line is boilerplate if it shows up on at least this share of a document's pages...
+BOILERPLATE_PAGE_RATIO = float(os.getenv("BOILERPLATE_PAGE_RATIO", 0.5))
+# ...or on at least this many pages spread across two or more documents
+BOILERPLATE_MIN_PAGES = int(os.getenv("BOILERPLATE_MIN_PAGES", 3))
+# Longer lines are treated as content even when repeated
+BOILERPLATE_MAX_LINE_LENGTH = 120
+# Only the first/last few lines of a page can be headers or footers
+BOILERPLATE_EDGE_LINES = int(os.getenv("BOILERPLATE_EDGE_LINES", 2))
+
+# Matched against a line with digit runs folded to '#', so "Page 3 of 40" and "12" both match
+PAGE_NUMBER_RE = re.compile(r'^(page|slide|p\.)?\s*#+(\s*(of|/)\s*#+)?$')
+# Footer-style notices such as "© 2024 Uni" or "Copyright (c) 2023 ..." - not prose about copyright
+COPYRIGHT_RE = re.compile(r'^(copyright|©|\(c\))(\s*(©|\(c\)))?\s*\d{4}\b', re.IGNORECASE)
+
+def normalize_line(line):
+    """Canonical form used to spot repeated lines and pages (case and spacing only)"""
+    return re.sub(r'\s+', ' ', line.lower()).strip(" -|•·")
+
+def find_boilerplate(documents):
+    """Return (boilerplate, repeated) sets of normalized lines.
+
+    Boilerplate lines are repeated across pages, slides or files and only ever
+    sit in a page's header/footer area; they are dropped everywhere. Lines that
+    repeat just as often but also appear inside page bodies are content (e.g.
+    a definition restated on several slides) and only lose their later copies.
+    """
+    frequent = set()
+    seen_in_docs = Counter()
+    seen_on_pages = Counter()
+    in_body = set()
+    seen_pages = set()
+
+    for doc in documents:
+        pages = doc["pages"]
+        per_doc = Counter()
+        for page in pages:
+            lines = [norm for norm in (normalize_line(line) for line in page.splitlines())
+                     if norm and not is_noise_line(norm)]
+            # Duplicate pages are dropped on their own; don't let them inflate counts
+            if tuple(lines) in seen_pages:
+                continue
+            seen_pages.add(tuple(lines))
+            edge = max(len(lines) - BOILERPLATE_EDGE_LINES, BOILERPLATE_EDGE_LINES)
+            in_body.update(lines[BOILERPLATE_EDGE_LINES:edge])
+            per_doc.update(set(lines))
+
+        for norm, count in per_doc.items():
+            if len(pages) >= BOILERPLATE_MIN_PAGES and count >= len(pages) * BOILERPLATE_PAGE_RATIO:
+                frequent.add(norm)
+            seen_in_docs[norm] += 1
+            seen_on_pages[norm] += count
+
+    for norm, doc_count in seen_in_docs.items():
+        if doc_count >= 2 and seen_on_pages[norm] >= BOILERPLATE_MIN_PAGES:
+            frequent.add(norm)
+
+    frequent = {norm for norm in frequent if len(norm) <= BOILERPLATE_MAX_LINE_LENGTH}
+    boilerplate = frequent - in_body
+    return boilerplate, frequent - boilerplate
+
+def is_noise_line(norm):
+    """Page numbers and short copyright footers, dropped even when they occur once"""
+    if len(norm) > BOILERPLATE_MAX_LINE_LENGTH:
+        return False
+    return bool(PAGE_NUMBER_RE.match(re.sub(r'\d+', '#', norm))) or bool(COPYRIGHT_RE.match(norm))
+
+def build_corpus(documents):
+    """Strip repeated headers/footers and duplicate pages from several parsed
+    documents and join them into one section-annotated corpus.
+
+    Each document is a dict with "filename" and "pages" (list of page texts
+    with line breaks). Returns (corpus_text, stats).
+    """
+    boilerplate, repeated = find_boilerplate(documents)
+    seen_repeated = set()
+    seen_pages = set()
+    sections = []
+    removed_lines = Counter()
+    removed_samples = {}
+    stats_docs = []
+    original_chars = 0
+    duplicate_pages = 0
+    repeated_copies = 0
+
+    for doc in documents:
+        kept_pages = []
+        doc_chars = 0
+        for page in doc["pages"]:
+            original_chars += len(page)
+            kept = []
+            for line in page.splitlines():
+                norm = normalize_line(line)
+                if not norm:
+                    continue
+                if norm in boilerplate or is_noise_line(norm):
+                    removed_lines[norm] += 1
+                    removed_samples.setdefault(norm, line.strip())
+                    continue
+                if kept and normalize_line(kept[-1]) == norm:
+                    continue
+                if norm in repeated:
+                    if norm in seen_repeated:
+                        repeated_copies += 1
+                        continue
+                    seen_repeated.add(norm)
+                kept.append(line.strip())
+
+            page_text = " ".join(kept)
+            if not page_text:
+                continue
+            page_key = normalize_line(page_text)
+            if page_key in seen_pages:
+                duplicate_pages += 1
+                continue
+            seen_pages.add(page_key)
+            kept_pages.append(page_text)
+            doc_chars += len(page_text)
+
+        if kept_pages:
+            sections.append(f"### {doc['filename']}\n" + "\n".join(kept_pages))
+        stats_docs.append({
+            "filename": doc["filename"],
+            "pages": len(doc["pages"]),
+            "keptPages": len(kept_pages),
+            "length": doc_chars
+        })
+
+    corpus = "\n\n".join(sections)
+    stats = {
+        "documents": stats_docs,
+        "originalLength": original_chars,
+        "length": len(corpus),
+        "reduction": round(1 - len(corpus) / original_chars, 3) if original_chars else 0,
+        "removedLines": sum(removed_lines.values()),
+        "duplicatePages": duplicate_pages,
+        "repeatedLines": repeated_copies,
+        "topBoilerplate": [removed_samples[norm] for norm, _ in removed_lines.most_common(10)]
+    }
+    return corpus, stats
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -42,6 +278,7 @@ def parse_file():
         file = request.files['file']
         filename = file.filename.lower()
         extracted_text = ""
+        pages = []
 
         # Parse PDF files using pdfplumber (more robust)
         if filename.endswith('.pdf'):
@@ -51,6 +288,7 @@ def parse_file():
                         page_text = page.extract_text()
                         if page_text:
                             extracted_text += page_text + "\n"
+                            pages.append(page_text)
             except Exception as pdf_err:
                 print(f"pdfplumber failed: {pdf_err}")
                 return jsonify({"success": False, "error": f"PDF parsing failed: {str(pdf_err)}"}), 500
@@ -58,11 +296,9 @@ def parse_file():
         # Parse PPTX files
         elif filename.endswith('.pptx'):
             try:
-                prs = Presentation(file)
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if hasattr(shape, "text"):
-                            extracted_text += shape.text + "\n"
+                for slide_text in extract_pptx_slides(file.stream):
+                    extracted_text += slide_text + "\n"
+                    pages.append(slide_text)
             except Exception as ppt_err:
                 print(f"PPTX parsing failed: {ppt_err}")
                 return jsonify({"success": False, "error": f"PPTX parsing failed: {str(ppt_err)}"}), 500
@@ -71,6 +307,7 @@ def parse_file():
         else:
             try:
                 extracted_text = file.read().decode("utf-8", errors="ignore")
+                pages = extracted_text.split("\f")
             except Exception as txt_err:
                 return jsonify({"success": False, "error": f"Text file parsing failed: {str(txt_err)}"}), 500
 
@@ -88,6 +325,7 @@ def parse_file():
         return jsonify({
             "success": True,
             "text": cleaned_text,
+            "pages": [p for p in (clean_page_text(page) for page in pages) if p],
             "filename": filename,
             "length": len(cleaned_text)
         }), 200
@@ -96,6 +334,33 @@ def parse_file():
         print(f"Parse error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/build-corpus', methods=['POST'])
+def build_corpus_route():
+    """Merge several parsed documents into one boilerplate-free corpus"""
+    try:
+        data = request.get_json(force=True)
+        documents = []
+        for i, doc in enumerate(data.get("documents") or []):
+            pages = doc.get("pages")
+            if not pages:
+                # Documents without page structure are treated as a single page
+                pages = [doc.get("text", "")]
+            pages = [clean_page_text(p) for p in pages if p]
+            if pages:
+                documents.append({"filename": doc.get("filename") or f"document-{i + 1}", "pages": pages})
+
+        if not documents:
+            return jsonify({"success": False, "error": "No documents provided"}), 400
+
+        corpus, stats = build_corpus(documents)
+        print(f"Built corpus from {len(documents)} documents (Original: {stats['originalLength']}, Corpus: {stats['length']})")
+
+        return jsonify({"success": True, "text": corpus, "stats": stats}), 200
+
+    except Exception as e:
+        print(f"Corpus build error: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5002))
     print(f"File Parser Service running on port {port}")
@@ -0,0 +1,192 @@
+import io
+import unittest
+
+import app as parser
+
+try:
+    from pptx import Presentation
+    from pptx.oxml.ns import qn
+    from pptx.util import Inches
+except ImportError:  # python-pptx is only needed to build test decks
+    Presentation = None
+
+
+def slide(*lines):
+    return "\n".join(lines)
+
+
+class IsNoiseLineTest(unittest.TestCase):
+
+    def test_page_numbers_are_noise(self):
+        for line in ("12", "page 3", "page 3 of 40", "slide 7", "p. 5", "4 / 20"):
+            with self.subTest(line=line):
+                self.assertTrue(parser.is_noise_line(parser.normalize_line(line)))
+
+    def test_copyright_footers_are_noise(self):
+        for line in ("© 2024 University of Somewhere", "Copyright (c) 2023 Dept. of CS", "(c) 2022"):
+            with self.subTest(line=line):
+                self.assertTrue(parser.is_noise_line(parser.normalize_line(line)))
+
+    def test_content_lines_are_kept(self):
+        for line in (
+            "Copyright law protects original works",
+            "Chapter 3 covers copyright",
+            "Page tables map virtual to physical addresses",
+            "1984 was published in 1949",
+            "O(n log n)",
+            "x = 42",
+        ):
+            with self.subTest(line=line):
+                self.assertFalse(parser.is_noise_line(parser.normalize_line(line)))
+
+    def test_long_lines_are_never_noise(self):
+        line = "© 2024 " + "word " * 40
+
+        self.assertFalse(parser.is_noise_line(parser.normalize_line(line)))
+
+
+class BuildCorpusTest(unittest.TestCase):
+
+    def test_repeated_headers_and_footers_are_removed(self):
+        pages = [
+            slide("CS101 Data Structures", f"Topic {i} body text", f"More about topic {i}", "University of Somewhere")
+            for i in range(4)
+        ]
+
+        corpus, stats = parser.build_corpus([{"filename": "l1.pdf", "pages": pages}])
+
+        self.assertNotIn("CS101 Data Structures", corpus)
+        self.assertNotIn("University of Somewhere", corpus)
+        self.assertIn("Topic 3 body text", corpus)
+        self.assertEqual(stats["removedLines"], 8)
+        self.assertIn("CS101 Data Structures", stats["topBoilerplate"])
+
+    def test_repeated_content_keeps_first_copy(self):
+        definition = "A stack is a LIFO structure: the last item pushed is the first popped"
+        l1 = [
+            slide("Stacks", "Overview of stacks", definition, "push and pop run in O(1)", "Lecture 1"),
+            slide("Stack example", "Undo history in editors", definition, "Browser back button", "Lecture 1"),
+        ]
+        l2 = [
+            slide("Recursion", "The call stack grows per call", definition, "Frames are popped on return", "Lecture 2"),
+        ]
+
+        corpus, stats = parser.build_corpus([
+            {"filename": "l1.pptx", "pages": l1},
+            {"filename": "l2.pptx", "pages": l2},
+        ])
+
+        self.assertEqual(corpus.count(definition), 1)
+        self.assertLess(corpus.index(definition), corpus.index("Undo history in editors"))
+        self.assertEqual(stats["repeatedLines"], 2)
+
+    def test_cross_document_footer_is_removed(self):
+        footer = "Dept. of Computer Science"
+        l1 = [slide(f"Slide {i} title", f"Point {i}a", f"Point {i}b", footer) for i in range(2)]
+        l2 = [slide(f"Deck two slide {i}", f"Idea {i}a", f"Idea {i}b", footer) for i in range(2)]
+
+        corpus, _ = parser.build_corpus([
+            {"filename": "l1.pptx", "pages": l1},
+            {"filename": "l2.pptx", "pages": l2},
+        ])
+
+        self.assertNotIn(footer, corpus)
+        self.assertIn("Idea 1b", corpus)
+
+    def test_duplicate_pages_and_page_numbers_are_dropped(self):
+        pages = [
+            slide("Heaps", "A heap is a complete binary tree", "3"),
+            slide("Heaps", "A heap is a complete binary tree", "4"),
+            slide("Tries", "A trie stores strings by prefix", "5"),
+        ]
+
+        corpus, stats = parser.build_corpus([{"filename": "l3.pdf", "pages": pages}])
+
+        self.assertEqual(corpus.count("A heap is a complete binary tree"), 1)
+        self.assertEqual(stats["duplicatePages"], 1)
+        self.assertTrue(corpus.startswith("### l3.pdf\n"))
+        self.assertNotRegex(corpus, r"\b[345]\b")
+
+
+
+@unittest.skipIf(Presentation is None, "python-pptx not installed")
+class ExtractPptxSlidesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        prs = Presentation()
+        blank = prs.slide_layouts[6]
+
+        first = prs.slides.add_slide(prs.slide_layouts[1])
+        first.shapes.title.text = "Stacks"
+        first.placeholders[1].text = "Push adds to the top"
+        first.notes_slide.notes_text_frame.text = "Mention the call stack"
+        cls.add_slide_number(first)
+
+        second = prs.slides.add_slide(blank)
+        table = second.shapes.add_table(2, 2, Inches(1), Inches(1), Inches(4), Inches(2)).table
+        for row, cells in enumerate([("Operation", "Cost"), ("push", "O(1)")]):
+            for col, text in enumerate(cells):
+                table.cell(row, col).text = text
+
+        third = prs.slides.add_slide(blank)
+        group = third.shapes.add_group_shape()
+        group.shapes.add_textbox(Inches(1), Inches(1), Inches(3), Inches(1)).text_frame.text = "Grouped label"
+        inner = group.shapes.add_group_shape()
+        inner.shapes.add_textbox(Inches(1), Inches(2), Inches(3), Inches(1)).text_frame.text = "Nested label"
+
+        # Show the table slide last without changing the part names on disk
+        id_list = prs.slides._sldIdLst
+        table_id = id_list[1]
+        id_list.remove(table_id)
+        id_list.append(table_id)
+
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        cls.deck = buffer.getvalue()
+
+    @staticmethod
+    def add_slide_number(slide):
+        """Append a slide-number field after the body text, as PowerPoint does for footers"""
+        box = slide.shapes.add_textbox(Inches(8), Inches(7), Inches(1), Inches(0.5))
+        paragraph = box.text_frame.paragraphs[0]._p
+        field = paragraph.makeelement(qn("a:fld"), {"id": "{B6F15528-21DE-4FAA-801E-634DDDAF4B2B}", "type": "slidenum"})
+        text = field.makeelement(qn("a:t"), {})
+        text.text = "1"
+        field.append(text)
+        paragraph.append(field)
+
+    def test_slides_follow_presentation_order(self):
+        slides = parser.extract_pptx_slides(io.BytesIO(self.deck))
+
+        self.assertEqual(len(slides), 3)
+        self.assertTrue(slides[0].startswith("Stacks"))
+        self.assertIn("Grouped label", slides[1])
+        self.assertIn("Operation", slides[2])
+
+    def test_text_shapes_tables_groups_and_notes(self):
+        slides = parser.extract_pptx_slides(io.BytesIO(self.deck))
+
+        self.assertEqual(slides[0].splitlines(), ["Stacks", "Push adds to the top", "Mention the call stack"])
+        self.assertEqual(slides[1].splitlines(), ["Grouped label", "Nested label"])
+        self.assertEqual(slides[2].splitlines(), ["Operation", "Cost", "push", "O(1)"])
+
+    def test_notes_can_be_left_out(self):
+        slides = parser.extract_pptx_slides(io.BytesIO(self.deck), include_notes=False)
+
+        self.assertEqual(slides[0].splitlines(), ["Stacks", "Push adds to the top"])
+
+    def test_parse_file_returns_slides_as_pages(self):
+        client = parser.app.test_client()
+
+        response = client.post("/parse-file", data={"file": (io.BytesIO(self.deck), "Lecture.pptx")},
+                               content_type="multipart/form-data")
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(body["pages"]), 3)
+        self.assertIn("Nested label", body["text"])
+
+
+if __name__ == "__main__":
+    unittest.main()
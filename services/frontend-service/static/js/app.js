@@ -5,6 +5,7 @@
 
 // Configuration
 let CLIENT_ID = '';
+let PREFETCH_ENABLED = false; // Server-side topics/summary prefetch (from /api/config)
 const DISCOVERY_DOCS = ["https://www.googleapis.com/discovery/v1/apis/classroom/v1/rest", "https://www.googleapis.com/discovery/v1/apis/drive/v3/rest"];
 const SCOPES = "https://www.googleapis.com/auth/classroom.courses.readonly https://www.googleapis.com/auth/drive.readonly https://www.googleapis.com/auth/classroom.announcements.readonly https://www.googleapis.com/auth/classroom.coursework.students.readonly https://www.googleapis.com/auth/classroom.courseworkmaterials.readonly";
 
@@ -163,6 +164,7 @@ async function fetchConfig() {
         if (data.clientId && data.clientId !== 'PLACEHOLDER_FOR_USER_TO_FILL') {
             CLIENT_ID = data.clientId;
         }
+        PREFETCH_ENABLED = data.prefetchEnabled === true;
         gapi.load('client', initializeGapiClient);
         initializeGisClient();
     } catch (e) {
@@ -401,11 +403,17 @@ async function loadCourseMaterials(courseId, courseName, courseBatch) {
             const filePromises = fileList.map(file => downloadAndParseFile(file.id, file.title));
 
             // Wait for all
-            const fileResults = await Promise.all(filePromises);
-
-            fileResults.forEach(text => {
-                if (text) aggregatedText += text + "\n";
-            });
+            const fileResults = (await Promise.all(filePromises)).filter(doc => doc);
+
+            // Strip repeated headers/footers across files before they eat the AI prompt window
+            const corpus = await buildCourseCorpus(fileResults);
+            if (corpus) {
+                aggregatedText += corpus + "\n";
+            } else {
+                fileResults.forEach(doc => {
+                    aggregatedText += doc.text + "\n";
+                });
+            }
         }
 
         // Fallback checks
@@ -428,6 +436,9 @@ async function loadCourseMaterials(courseId, courseName, courseBatch) {
             files: fileList
         };
 
+        // Warm up topics/summary while the user picks an action
+        prefetchInsights(aggregatedText);
+
         // Show Action Menu instead of direct generation
         switchView('action-menu');
 
@@ -438,6 +449,40 @@ async function loadCourseMaterials(courseId, courseName, courseBatch) {
     }
 }
 
+// Fire-and-forget: lets the server start topics/summary generation early (if enabled)
+function prefetchInsights(text) {
+    if (!PREFETCH_ENABLED) return;
+    const settings = getSettings();
+    fetch('/api/prefetch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            text: text,
+            provider: settings.provider,
+            model: settings.model
+        })
+    }).catch(e => console.warn("Prefetch request failed", e));
+}
+
+// Merge parsed documents server-side into a deduplicated corpus (null on failure)
+async function buildCourseCorpus(docs) {
+    if (docs.length === 0) return null;
+    try {
+        const response = await fetch('/api/build-corpus', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ documents: docs })
+        });
+        const data = await response.json();
+        if (!data.success) return null;
+        console.log(`Corpus built: ${data.stats.originalLength} -> ${data.stats.length} chars`);
+        return data.text;
+    } catch (e) {
+        console.warn("Corpus build failed, using raw text", e);
+        return null;
+    }
+}
+
 // Reuse cache to prevent re-downloading same files
 async function downloadAndParseFile(fileId, fileName) {
     const CACHE_KEY = `doc_cache_${fileId}`;
@@ -446,7 +491,13 @@ async function downloadAndParseFile(fileId, fileName) {
     const cached = localStorage.getItem(CACHE_KEY);
     if (cached) {
         console.log(`Loaded ${fileName} from cache`);
-        return cached;
+        try {
+            const doc = JSON.parse(cached);
+            if (doc && doc.text) return doc;
+        } catch (e) {
+            // Older cache entries hold plain text only
+        }
+        return { filename: fileName, text: cached, pages: [] };
     }
 
     try {
@@ -470,15 +521,15 @@ async function downloadAndParseFile(fileId, fileName) {
 
         const data = await parseResp.json();
         if (data.success) {
+            const doc = { filename: fileName, text: data.text, pages: data.pages || [] };
             // 4. Save to Cache (Limit size to avoid quota errors - e.g. store first 50kb)
             try {
                 // simple length check, maybe trim if too huge
-                const content = data.text;
-                localStorage.setItem(CACHE_KEY, content);
+                localStorage.setItem(CACHE_KEY, JSON.stringify(doc));
             } catch (e) {
                 console.warn("Cache full");
             }
-            return data.text;
+            return doc;
         }
         return null;
 
@@ -9,4 +9,6 @@ python services/frontend-service/app.py &
 # Start API Gateway (main entry point) in foreground
 # Use port 7860 for Hugging Face compatibility
 export PORT=7860
+# Hugging Face puts one reverse proxy in front of the gateway
+export TRUSTED_PROXY_HOPS=${TRUSTED_PROXY_HOPS:-1}
 python services/api-gateway/app.py